@@ -9,7 +9,7 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 
-@dataclass
+@dataclass(slots=True)
 class EmailRecord:
     """Database model for emails."""
 
@@ -77,7 +77,7 @@ class EmailRecord:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class CalendarEvent:
     """Database model for calendar events."""
 
@@ -133,7 +133,7 @@ class CalendarEvent:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class TrainingDataRecord:
     """Database model for ML training data."""
 
@@ -160,7 +160,7 @@ class TrainingDataRecord:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ModelVersion:
     """Database model for ML model versions."""
 
@@ -193,7 +193,7 @@ class ModelVersion:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ReminderRecord:
     """Database model for reminders."""
 
@@ -220,7 +220,7 @@ class ReminderRecord:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ProcessingRule:
     """Database model for email processing rules."""
 
@@ -251,7 +251,7 @@ class ProcessingRule:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class SenderStats:
     """Database model for sender statistics."""
 
@@ -284,7 +284,7 @@ class SenderStats:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class EmailAction:
     """Database model for email actions."""
 
@@ -5,10 +5,16 @@ Provides AES-256 encryption for SQLite databases at rest.
 """
 
 import logging
+import sqlite3
 from pathlib import Path
 from typing import Optional
 import secrets
 
+try:
+    from pysqlcipher3 import dbapi2 as _sqlcipher
+except ImportError:
+    _sqlcipher = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,10 +27,7 @@ class EncryptionManager:
 
     def _verify_sqlcipher_available(self):
         """Verify SQLCipher is available."""
-        try:
-            import pysqlcipher3
-            logger.info("SQLCipher is available for database encryption")
-        except ImportError as e:
+        if _sqlcipher is None:
             logger.error(
                 "SQLCipher not available. Database encryption will not work. "
                 "Install with: pip install pysqlcipher3"
@@ -32,7 +35,8 @@ class EncryptionManager:
             raise RuntimeError(
                 "SQLCipher (pysqlcipher3) not installed. "
                 "Database encryption requires SQLCipher."
-            ) from e
+            )
+        logger.info("SQLCipher is available for database encryption")
 
     @staticmethod
     def generate_key() -> str:
@@ -60,10 +64,11 @@ class EncryptionManager:
             Exception: If connection fails
         """
         try:
-            from pysqlcipher3 import dbapi2 as sqlite
+            if _sqlcipher is None:
+                raise RuntimeError("SQLCipher (pysqlcipher3) not installed")
 
             # Connect to database
-            conn = sqlite.connect(db_path)
+            conn = _sqlcipher.connect(db_path)
 
             # Set encryption key
             conn.execute(f"PRAGMA key = '{key}'")
@@ -172,8 +177,6 @@ class EncryptionManager:
             True if encrypted, False if not
         """
         try:
-            import sqlite3
-
             # Try to open with standard SQLite (should fail if encrypted)
             conn = sqlite3.connect(db_path)
             conn.execute("SELECT count(*) FROM sqlite_master")
@@ -213,9 +216,6 @@ class EncryptionManager:
             Exception: If encryption fails
         """
         try:
-            import sqlite3
-            from pysqlcipher3 import dbapi2 as sqlite_encrypted
-
             # Open unencrypted database
             source = sqlite3.connect(unencrypted_path)
 
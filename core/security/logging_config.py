@@ -4,11 +4,19 @@ Secure logging configuration.
 Prevents sensitive data from being logged while maintaining useful debug information.
 """
 
+import atexit
 import logging
 import re
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
 from pathlib import Path
+from queue import Queue
 from typing import Optional
 
+# Background file logging state (see setup_logging)
+_log_queue: Optional[Queue] = None
+_queue_listener: Optional[QueueListener] = None
+_memory_handler: Optional[MemoryHandler] = None
+
 
 class SensitiveDataFilter(logging.Filter):
     """
@@ -73,14 +81,21 @@ class SensitiveDataFilter(logging.Filter):
         Returns:
             Sanitized text
         """
+        # Each pattern is only run when its required literal can be present,
+        # so the common case (short messages without addresses or secrets)
+        # never enters the regex engine.
+
         # Mask email addresses (keep first char and domain)
-        text = self.EMAIL_PATTERN.sub(r'\1***@\3', text)
+        if '@' in text:
+            text = self.EMAIL_PATTERN.sub(r'\1***@\3', text)
 
         # Mask tokens and keys
-        text = self.TOKEN_PATTERN.sub('[TOKEN]', text)
+        if len(text) >= 32:
+            text = self.TOKEN_PATTERN.sub('[TOKEN]', text)
 
         # Mask password/key parameters
-        text = self.PARAM_PATTERN.sub(r'\1=***', text)
+        if ':' in text or '=' in text:
+            text = self.PARAM_PATTERN.sub(r'\1=***', text)
 
         return text
 
@@ -92,7 +107,7 @@ class EmailBodyFilter(logging.Filter):
     Only applies in production (when LOG_SENSITIVE_DATA=false).
     """
 
-    BODY_INDICATORS = ['body:', 'content:', 'message:', 'text:']
+    BODY_INDICATORS = ('body:', 'content:', 'message:', 'text:')
 
     def filter(self, record: logging.LogRecord) -> bool:
         """
@@ -107,14 +122,16 @@ class EmailBodyFilter(logging.Filter):
         if isinstance(record.msg, str):
             msg_lower = record.msg.lower()
 
-            # Check if this looks like it contains email body
-            if any(indicator in msg_lower for indicator in self.BODY_INDICATORS):
-                # Truncate after indicator
-                for indicator in self.BODY_INDICATORS:
-                    if indicator in msg_lower:
-                        idx = msg_lower.index(indicator)
-                        record.msg = record.msg[:idx + len(indicator)] + ' [REDACTED]'
-                        break
+            # Find the earliest indicator that looks like it starts email body
+            cut = -1
+            for indicator in self.BODY_INDICATORS:
+                idx = msg_lower.find(indicator)
+                if idx >= 0 and (cut < 0 or idx + len(indicator) < cut):
+                    cut = idx + len(indicator)
+
+            # Truncate after indicator
+            if cut >= 0:
+                record.msg = record.msg[:cut] + ' [REDACTED]'
 
         return True
 
@@ -139,6 +156,7 @@ def setup_logging(
     logger.setLevel(getattr(logging, log_level.upper()))
 
     # Clear existing handlers
+    _stop_file_listener()
     logger.handlers.clear()
 
     # Create formatters
@@ -179,7 +197,7 @@ def setup_logging(
             file_handler.addFilter(SensitiveDataFilter())
             file_handler.addFilter(EmailBodyFilter())
 
-        logger.addHandler(file_handler)
+        _start_file_listener(logger, file_handler)
 
     # Set up library loggers
     _configure_library_loggers(log_level)
@@ -187,6 +205,64 @@ def setup_logging(
     logger.info(f"Logging configured: level={log_level}, file={log_file}, sensitive_data={log_sensitive_data}")
 
 
+def _start_file_listener(logger: logging.Logger, file_handler: logging.Handler) -> None:
+    """
+    Route file logging through a background thread.
+
+    The logger only enqueues records; a QueueListener thread hands them to a
+    MemoryHandler that writes to the file in batches, flushing immediately
+    on ERROR and above.
+
+    Args:
+        logger: Application logger
+        file_handler: Configured file handler (formatter and filters attached)
+    """
+    global _log_queue, _queue_listener, _memory_handler
+
+    _log_queue = Queue(-1)
+    _memory_handler = MemoryHandler(
+        capacity=1024,
+        flushLevel=logging.ERROR,
+        target=file_handler
+    )
+    _memory_handler.setLevel(file_handler.level)
+
+    _queue_listener = QueueListener(_log_queue, _memory_handler, respect_handler_level=True)
+    _queue_listener.start()
+
+    logger.addHandler(QueueHandler(_log_queue))
+
+
+def _stop_file_listener() -> None:
+    """Stop the background file logger, writing out any buffered records."""
+    global _log_queue, _queue_listener, _memory_handler
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+
+    if _memory_handler is not None:
+        target = _memory_handler.target
+        _memory_handler.close()
+        if target is not None:
+            target.close()
+
+    _log_queue = None
+    _queue_listener = None
+    _memory_handler = None
+
+
+def flush_logging() -> None:
+    """Block until queued log records have been written to the log file."""
+    if _log_queue is not None:
+        _log_queue.join()
+
+    if _memory_handler is not None:
+        _memory_handler.flush()
+
+
+atexit.register(_stop_file_listener)
+
+
 def _configure_library_loggers(log_level: str):
     """
     Configure logging for third-party libraries.
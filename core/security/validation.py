@@ -11,7 +11,7 @@ Protects against:
 
 import re
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,19 +20,25 @@ logger = logging.getLogger(__name__)
 class SecurityValidator:
     """Validate and sanitize user inputs to prevent security vulnerabilities."""
 
+    # Patterns are unanchored and applied with fullmatch(), which avoids
+    # the '^...$' scan and rejects trailing newlines that '$' would allow.
+
     # Gmail message IDs are hexadecimal strings
-    MESSAGE_ID_PATTERN = re.compile(r'^[a-f0-9]{16,}$', re.IGNORECASE)
+    MESSAGE_ID_PATTERN = re.compile(r'[a-f0-9]{16,}', re.IGNORECASE | re.ASCII)
 
     # Gmail label/folder names: alphanumeric, spaces, underscores, hyphens
-    LABEL_NAME_PATTERN = re.compile(r'^[\w\s\-/]{1,100}$')
+    LABEL_NAME_PATTERN = re.compile(r'[\w\s\-/]{1,100}')
 
     # Email address pattern (basic validation)
     EMAIL_PATTERN = re.compile(
-        r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+        r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
     )
 
     # Thread ID pattern (similar to message ID)
-    THREAD_ID_PATTERN = re.compile(r'^[a-f0-9]{16,}$', re.IGNORECASE)
+    THREAD_ID_PATTERN = re.compile(r'[a-f0-9]{16,}', re.IGNORECASE | re.ASCII)
+
+    # Filename translation: directory separators -> '_', null bytes removed
+    FILENAME_TRANSLATION = str.maketrans({'/': '_', '\\': '_', '\x00': None})
 
     @staticmethod
     def validate_message_id(msg_id: str) -> str:
@@ -56,7 +62,7 @@ class SecurityValidator:
         if not msg_id:
             raise ValueError("Message ID cannot be empty")
 
-        if not SecurityValidator.MESSAGE_ID_PATTERN.match(msg_id):
+        if not SecurityValidator.MESSAGE_ID_PATTERN.fullmatch(msg_id):
             raise ValueError(
                 f"Invalid message ID format: {msg_id[:50]}... "
                 "(expected hexadecimal string)"
@@ -64,6 +70,37 @@ class SecurityValidator:
 
         return msg_id
 
+    @staticmethod
+    def validate_message_ids_bulk(msg_ids: Iterable[str], strict: bool = True) -> List[str]:
+        """
+        Validate many Gmail message IDs in one call.
+
+        Args:
+            msg_ids: Gmail message IDs
+            strict: If True, raise on the first invalid ID; otherwise drop invalid IDs
+
+        Returns:
+            List of validated (stripped) message IDs, in input order
+
+        Raises:
+            ValueError: If strict and any message ID is invalid
+        """
+        fullmatch = SecurityValidator.MESSAGE_ID_PATTERN.fullmatch
+        validated = []
+
+        for msg_id in msg_ids:
+            if isinstance(msg_id, str):
+                msg_id = msg_id.strip()
+                if fullmatch(msg_id):
+                    validated.append(msg_id)
+                    continue
+
+            if strict:
+                # Re-run the single-ID path for its specific error message
+                SecurityValidator.validate_message_id(msg_id)
+
+        return validated
+
     @staticmethod
     def validate_thread_id(thread_id: str) -> str:
         """
@@ -86,7 +123,7 @@ class SecurityValidator:
         if not thread_id:
             raise ValueError("Thread ID cannot be empty")
 
-        if not SecurityValidator.THREAD_ID_PATTERN.match(thread_id):
+        if not SecurityValidator.THREAD_ID_PATTERN.fullmatch(thread_id):
             raise ValueError(
                 f"Invalid thread ID format: {thread_id[:50]}... "
                 "(expected hexadecimal string)"
@@ -119,7 +156,7 @@ class SecurityValidator:
         if len(label) > 100:
             raise ValueError(f"Label name too long: {len(label)} chars (max 100)")
 
-        if not SecurityValidator.LABEL_NAME_PATTERN.match(label):
+        if not SecurityValidator.LABEL_NAME_PATTERN.fullmatch(label):
             raise ValueError(
                 f"Invalid label name: {label[:50]}... "
                 "(allowed: letters, numbers, spaces, hyphens, underscores, slashes)"
@@ -152,7 +189,12 @@ class SecurityValidator:
         if len(email) > 254:  # RFC 5321
             raise ValueError(f"Email address too long: {len(email)} chars")
 
-        if not SecurityValidator.EMAIL_PATTERN.match(email):
+        # Cheap structural check before running the regex
+        at_idx = email.find('@')
+        if at_idx < 1 or email.find('.', at_idx) < 0:
+            raise ValueError(f"Invalid email format: {email}")
+
+        if not SecurityValidator.EMAIL_PATTERN.fullmatch(email):
             raise ValueError(f"Invalid email format: {email}")
 
         return email
@@ -210,11 +252,8 @@ class SecurityValidator:
         if not filename:
             raise ValueError("Filename cannot be empty")
 
-        # Remove directory separators
-        filename = filename.replace('/', '_').replace('\\', '_')
-
-        # Remove null bytes
-        filename = filename.replace('\x00', '')
+        # Remove directory separators and null bytes in a single pass
+        filename = filename.translate(SecurityValidator.FILENAME_TRANSLATION)
 
         # Limit length
         if len(filename) > 255:
@@ -294,7 +333,7 @@ class SecurityValidator:
             text = str(text)
 
         # Mask email addresses
-        if mask_email:
+        if mask_email and '@' in text:
             text = re.sub(
                 r'\b([a-zA-Z0-9._%+-])([a-zA-Z0-9._%+-]*)@([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b',
                 r'\1***@\3',
@@ -302,11 +341,12 @@ class SecurityValidator:
             )
 
         # Mask potential tokens/keys (long alphanumeric strings)
-        text = re.sub(
-            r'\b[a-zA-Z0-9]{32,}\b',
-            '[TOKEN]',
-            text
-        )
+        if len(text) >= 32:
+            text = re.sub(
+                r'\b[a-zA-Z0-9]{32,}\b',
+                '[TOKEN]',
+                text
+            )
 
         return text
 
@@ -4,17 +4,30 @@ This module handles email access, authentication, and basic email operations.
 """
 
 import os
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
-from datetime import datetime
+import json
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from dataclasses import dataclass, field
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import getaddresses
 import logging
+import threading
+import queue
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import AuthorizedSession, Request
 from googleapiclient.discovery import build
-import pickle
+from googleapiclient.errors import HttpError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 import re
 
+# pybase64 is an optional SIMD-accelerated drop-in for base64
+try:
+    from pybase64 import urlsafe_b64decode
+except ImportError:
+    from base64 import urlsafe_b64decode
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,7 +35,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class EmailMessage:
     """
     Data class to store email information in a standardized format.
@@ -37,8 +50,8 @@ class EmailMessage:
     body_html: Optional[str]
     is_human_generated: Optional[bool] = None
     importance_score: Optional[float] = None
-    headers: Dict[str, str] = None
-    labels: List[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    labels: List[str] = field(default_factory=list)
     thread_id: str = None  # For thread-related operations
 
     def get_summary(self, max_length: int = 100) -> str:
@@ -72,13 +85,78 @@ class GmailHandler:
         'https://www.googleapis.com/auth/gmail.modify'
     ]
     
+    # Sub-requests per HTTP batch call (Gmail allows 100, recommends <= 50)
+    BATCH_SIZE = 50
+    
+    # Concurrent requests when the batch endpoint is unavailable
+    FALLBACK_WORKERS = 10
+    GMAIL_API_URL = 'https://gmail.googleapis.com/gmail/v1/users/me'
+    
+    # Sub-requests failing with these statuses (rate limits and transient
+    # server errors), or with a 403 whose reason is a rate limit, are retried
+    # up to FETCH_RETRIES times, waiting RETRY_DELAY seconds before the first
+    # retry and doubling it each time. Other 403s are permanent.
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    RATE_LIMIT_REASONS = frozenset({'rateLimitExceeded', 'userRateLimitExceeded'})
+    FETCH_RETRIES = 3
+    RETRY_DELAY = 1.0
+    
+    # Fetched batches buffered ahead of historical-email classification
+    PREFETCH_BATCHES = 2
+    
+    # Partial-response masks for messages.get, listing exactly the fields each
+    # consumer reads: fetch_recent_emails (with _get_headers and _get_bodies)
+    # and _classify_message (with _get_headers, _get_body_text and the part
+    # filenames). Only the top-level MIME parts are read.
+    FETCH_FIELDS = ('id,threadId,internalDate,labelIds,'
+                    'payload(headers,body/data,parts(mimeType,body/data))')
+    ANALYZE_FIELDS = 'internalDate,payload(headers,body/data,parts(mimeType,filename,body/data))'
+    
+    # How analyze_historical_emails turns pattern frequencies into weights:
+    # (category, frequency multiplier, which keys get a weight or None for all)
+    WEIGHT_FACTORS = (
+        ('headers', 2, None),  # Higher frequency = higher weight for bot detection
+        ('keywords', 2, None),
+        ('patterns', 2, None),
+        ('sender_patterns', 3, None),  # Very frequent senders might be bots
+        ('subject_patterns', 2, None),
+        ('time_patterns', 2, lambda hour: hour < 6 or hour > 22),  # Late night/early morning
+        ('length_patterns', 1.5, lambda length: length in ('short', 'long')),
+        ('link_patterns', 2, lambda pattern: pattern == 'many'),  # Many links might be marketing
+        ('domain_patterns', 2, None),  # Frequent domains might be automated
+        ('content_patterns', 2.5, None),  # Marketing content patterns are strong indicators
+        ('reply_patterns', 0.5, None),  # Lower weight as it indicates human
+        ('attachment_patterns', 0.3, None),  # Lower weight as it indicates human
+        ('spacing_patterns', 1.5, lambda pattern: pattern == 'dense'),
+        ('signature_patterns', 0.4, None),  # Lower weight as it indicates human
+    )
+    
+    # Subject words counted as marketing by analyze_historical_emails
+    MARKETING_SUBJECT_WORDS = ('sale', 'offer', 'discount', 'limited time')
+    
+    # Gmail categories whose messages are treated as bot-generated outright
+    BOT_CATEGORY_LABELS = frozenset({
+        'CATEGORY_PROMOTIONS', 'CATEGORY_SOCIAL', 'CATEGORY_UPDATES'
+    })
+    
+    # Refresh the OAuth token this many seconds before it expires
+    TOKEN_REFRESH_MARGIN = 300
+    
+    # Links in message bodies. '$-_' is the range 0x24-0x5F, which covers
+    # digits, upper-case letters, '%' escapes and URL punctuation, so one
+    # character class replaces the old alternation without backtracking.
+    URL_PATTERN = re.compile(r'http[s]?://[!$-_a-z]+')
+    
     def __init__(self, credentials_path: str = 'credentials.json', 
-                 token_path: str = 'token.pickle',
+                 token_path: str = 'token.json',
                  weights_path: str = 'bot_weights.json'):
         self.credentials_path = credentials_path
         self.token_path = token_path
         self.weights_path = weights_path
         self.service = None
+        self._creds = None
+        self._refresh_timer = None
+        self._label_cache: Optional[Dict[str, str]] = None
         
         # Initialize bot indicators with default weights
         self.bot_indicators = {
@@ -104,7 +182,7 @@ class GmailHandler:
                 'click here': 0.7
             },
             'patterns': {
-                r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+': 0.6,
+                r'http[s]?://[!$-_a-z]+': 0.6,
                 r'[0-9]{3}-[0-9]{3}-[0-9]{4}': 0.5,
                 r'\$\d+\.?\d*': 0.5
             },
@@ -116,25 +194,42 @@ class GmailHandler:
             'domain_patterns': {}
         }
         
-        # Try to load saved weights
-        self.load_learned_weights(weights_path)
+        # State derived from bot_indicators
+        self._compiled_patterns = []
+        self._header_weights = {}
+        
+        # Try to load saved weights; loading rebuilds the derived state itself
+        if not self.load_learned_weights(weights_path):
+            self._refresh_bot_indicators()
+        
+    def _refresh_bot_indicators(self) -> None:
+        """Rebuilds state derived from bot_indicators; call whenever the weights change."""
+        self._compiled_patterns = [
+            (re.compile(pattern), weight)
+            for pattern, weight in self.bot_indicators['patterns'].items()
+        ]
+        self._header_weights = {}
+        for header, weight in self.bot_indicators['headers'].items():
+            key = header.lower()
+            self._header_weights[key] = self._header_weights.get(key, 0.0) + weight
         
     def authenticate(self) -> None:
         """
         Handles Gmail API authentication using OAuth 2.0.
-        Saves credentials to token.pickle for future use.
+        Saves credentials to token.json for future use.
         """
         creds = None
         
         # Load existing token if available
         if os.path.exists(self.token_path):
-            with open(self.token_path, 'rb') as token:
-                creds = pickle.load(token)
+            with open(self.token_path, 'r') as token:
+                creds = Credentials.from_authorized_user_info(json.load(token), self.SCOPES)
         
         # Refresh token if expired
         if creds and creds.expired and creds.refresh_token:
             try:
                 creds.refresh(Request())
+                self._save_credentials(creds)
             except Exception as e:
                 logger.error(f"Error refreshing credentials: {e}")
                 creds = None
@@ -151,12 +246,52 @@ class GmailHandler:
             creds = flow.run_local_server(port=0)
             
             # Save credentials for future use
-            with open(self.token_path, 'wb') as token:
-                pickle.dump(creds, token)
+            self._save_credentials(creds)
         
+        self._creds = creds
         self.service = build('gmail', 'v1', credentials=creds)
+        self._schedule_token_refresh()
         logger.info("Successfully authenticated with Gmail API")
 
+    def _save_credentials(self, creds: Credentials) -> None:
+        """Saves OAuth credentials to token_path."""
+        with open(self.token_path, 'w') as token:
+            token.write(creds.to_json())
+
+    def _schedule_token_refresh(self) -> None:
+        """
+        Arms a background timer that refreshes the OAuth token shortly before
+        it expires, so API calls never block on a synchronous refresh.
+        """
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+        
+        creds = self._creds
+        if not creds or not creds.refresh_token or not creds.expiry:
+            return
+        
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        delay = (creds.expiry - now).total_seconds() - self.TOKEN_REFRESH_MARGIN
+        
+        self._refresh_timer = threading.Timer(max(delay, 0), self._refresh_token)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _refresh_token(self) -> None:
+        """Refreshes and saves the OAuth token, then re-arms the refresh timer."""
+        try:
+            self._creds.refresh(Request())
+            self._save_credentials(self._creds)
+            logger.info("Refreshed Gmail OAuth token")
+        except Exception as e:
+            # The client library still refreshes lazily on the next call
+            logger.error(f"Error refreshing credentials: {e}")
+            return
+        
+        self._schedule_token_refresh()
+
     def is_bot_generated(self, headers: Dict[str, str], body: str) -> Tuple[bool, float]:
         """
         Determines if an email is likely bot-generated based on headers and content.
@@ -166,15 +301,30 @@ class GmailHandler:
             headers: Email headers dictionary
             body: Email body text
         
+        Returns:
+            Tuple[bool, float]: (True if likely bot-generated, confidence score 0-1)
+        """
+        return self._score_message({h.lower() for h in headers}, body)
+
+    def _score_message(self, header_names: Iterable[str], body: str) -> Tuple[bool, float]:
+        """
+        Scores a message for is_bot_generated.
+        
+        Args:
+            header_names: Distinct lower-cased header names of the message
+            body: Email body text
+            
         Returns:
             Tuple[bool, float]: (True if likely bot-generated, confidence score 0-1)
         """
         confidence_score = 0.0
         max_score = 0.0
         
-        # Check headers
-        for header, weight in self.bot_indicators['headers'].items():
-            if any(h.lower() == header.lower() for h in headers.keys()):
+        # Check headers, looking up only the ones this message carries
+        header_weights = self._header_weights
+        for header in header_names:
+            weight = header_weights.get(header)
+            if weight is not None:
                 confidence_score += weight
                 max_score += weight
         
@@ -186,8 +336,8 @@ class GmailHandler:
                 max_score += weight
         
         # Check patterns
-        for pattern, weight in self.bot_indicators['patterns'].items():
-            if re.search(pattern, body):
+        for pattern, weight in self._compiled_patterns:
+            if pattern.search(body):
                 confidence_score += weight
                 max_score += weight
         
@@ -203,6 +353,26 @@ class GmailHandler:
         
         return final_score > 0.5, final_score
 
+    def _classify_email(self, label_ids: List[str], headers: Dict[str, str],
+                        body: str) -> Tuple[bool, float]:
+        """
+        Bot detection for a fetched message, reusing Gmail's own categorization
+        where possible.
+        
+        Args:
+            label_ids: Gmail label IDs on the message
+            headers: Headers from _get_headers, keyed by lower-cased name
+            body: Email body text
+            
+        Returns:
+            Tuple[bool, float]: (True if likely bot-generated, confidence score 0-1)
+        """
+        if self.BOT_CATEGORY_LABELS.intersection(label_ids):
+            return True, 0.95
+        
+        # The keys are already lower-cased and distinct, so skip the copy
+        return self._score_message(headers.keys(), body)
+
     def mark_as_read(self, message_id: str) -> bool:
         """
         Marks an email as read.
@@ -237,14 +407,7 @@ class GmailHandler:
             bool: True if successful, False otherwise
         """
         try:
-            # First, get all labels to find the correct one
-            labels = self.service.users().labels().list(userId='me').execute()
-            label_id = None
-            
-            for label in labels.get('labels', []):
-                if label['name'].lower() == folder_name.lower():
-                    label_id = label['id']
-                    break
+            label_id = self._get_label_id(folder_name)
             
             if not label_id:
                 logger.error(f"Folder/label '{folder_name}' not found")
@@ -264,6 +427,30 @@ class GmailHandler:
             logger.error(f"Error moving email: {e}")
             return False
 
+    def _get_label_id(self, name: str) -> Optional[str]:
+        """
+        Looks up a label ID by case-insensitive name.
+        
+        The name-to-ID map is fetched once and reused; a name that is not in
+        it triggers a single refetch in case the label was created since.
+        
+        Args:
+            name: The label name
+            
+        Returns:
+            Optional[str]: The label ID, or None if no such label exists
+        """
+        key = name.lower()
+        if self._label_cache is not None and key in self._label_cache:
+            return self._label_cache[key]
+        
+        labels = self.service.users().labels().list(userId='me').execute()
+        self._label_cache = {}
+        for label in labels.get('labels', []):
+            self._label_cache.setdefault(label['name'].lower(), label['id'])
+        
+        return self._label_cache.get(key)
+
     def delete_email(self, message_id: str) -> bool:
         """
         Moves an email to the trash.
@@ -420,25 +607,24 @@ class GmailHandler:
                 return []
             
             email_messages = []
-            for message in messages:
-                msg = self.service.users().messages().get(
-                    userId='me', id=message['id'], format='full').execute()
+            for msg in self._get_messages([m['id'] for m in messages],
+                                          format='full', fields=self.FETCH_FIELDS):
                 
                 # Extract headers
-                headers = {}
-                for header in msg['payload']['headers']:
-                    headers[header['name'].lower()] = header['value']
+                headers = self._get_headers(msg['payload'])
                 
                 # Extract recipients
-                recipients = []
-                if 'to' in headers:
-                    recipients.extend([addr.strip() for addr in headers['to'].split(',')])
-                if 'cc' in headers:
-                    recipients.extend([addr.strip() for addr in headers['cc'].split(',')])
+                # getaddresses handles quoted display names containing commas
+                recipients = [
+                    addr for _, addr in getaddresses([headers.get('to', ''), headers.get('cc', '')])
+                    if addr
+                ]
                 
                 # Extract body
-                body_text = self._get_body_text(msg['payload'])
-                body_html = self._get_body_html(msg['payload'])
+                body_text, body_html = self._get_bodies(msg['payload'])
+                
+                label_ids = msg.get('labelIds', [])
+                is_bot, _ = self._classify_email(label_ids, headers, body_text)
                 
                 # Create EmailMessage object
                 email_msg = EmailMessage(
@@ -450,7 +636,8 @@ class GmailHandler:
                     body_text=body_text,
                     body_html=body_html,
                     headers=headers,
-                    is_human_generated=not self.is_bot_generated(headers, body_text)[0],
+                    is_human_generated=not is_bot,
+                    labels=label_ids,
                     thread_id=msg.get('threadId')
                 )
                 
@@ -462,6 +649,254 @@ class GmailHandler:
             logger.error(f"Error fetching emails: {e}")
             return []
 
+    def _get_messages(self, message_ids: List[str], **get_kwargs) -> List[Dict]:
+        """
+        Fetches message resources using Gmail's HTTP batch endpoint.
+        
+        Issues one HTTP request per BATCH_SIZE messages instead of one per
+        message. Messages whose sub-request was rate limited, or whose whole
+        batch failed, are retried with concurrent individual requests.
+        
+        Args:
+            message_ids: IDs of the messages to fetch
+            **get_kwargs: Extra arguments for messages().get() (e.g. format)
+            
+        Returns:
+            List[Dict]: Message resources in the order of message_ids;
+            messages that could not be fetched are skipped
+        """
+        messages = []
+        for batch in self._iter_message_batches(message_ids, **get_kwargs):
+            messages.extend(batch)
+        return messages
+
+    def _iter_message_batches(self, message_ids: List[str], stop: Optional[threading.Event] = None,
+                              **get_kwargs) -> Iterator[List[Dict]]:
+        """
+        Yields the messages of each BATCH_SIZE chunk as soon as it is fetched.
+        
+        Args:
+            message_ids: IDs of the messages to fetch
+            stop: Event that ends fetching before the next request once set
+            **get_kwargs: Extra arguments for messages().get() (e.g. format)
+            
+        Yields:
+            List[Dict]: Message resources of one chunk, in the order of message_ids
+        """
+        if stop is None:
+            stop = threading.Event()
+        results = {}
+        failed = []
+        
+        def _collect(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            elif isinstance(exception, HttpError) and self._is_retryable(exception):
+                failed.append(request_id)
+            else:
+                logger.error(f"Error fetching message {request_id}: {exception}")
+        
+        ids = iter(message_ids)
+        while not stop.is_set():
+            chunk = list(islice(ids, self.BATCH_SIZE))
+            if not chunk:
+                break
+            
+            batch = self.service.new_batch_http_request(callback=_collect)
+            for message_id in chunk:
+                batch.add(
+                    self.service.users().messages().get(
+                        userId='me', id=message_id, **get_kwargs),
+                    request_id=message_id
+                )
+            
+            try:
+                batch.execute()
+            except HttpError as e:
+                logger.warning(f"Batch request failed, fetching messages individually: {e}")
+                missing = [message_id for message_id in chunk if message_id not in results]
+                if self._is_retryable(e):
+                    failed[:] = missing
+                else:
+                    results.update(self._get_messages_concurrently(missing, stop, **get_kwargs))
+            
+            if failed:
+                results.update(self._retry_messages(failed, stop, **get_kwargs))
+                failed.clear()
+            
+            fetched = [results[message_id] for message_id in chunk if message_id in results]
+            results.clear()
+            yield fetched
+
+    def _prefetch_messages(self, message_ids: List[str], **get_kwargs) -> Iterator[Dict]:
+        """
+        Yields message resources while a background thread fetches the next batches.
+        
+        Lets CPU-bound per-message work overlap the network round trips. Up to
+        PREFETCH_BATCHES batches are buffered. Once the caller stops iterating,
+        the fetching thread makes no further requests and is joined before
+        this generator finishes, so the service is never used by two threads.
+        
+        Args:
+            message_ids: IDs of the messages to fetch
+            **get_kwargs: Extra arguments for messages().get() (e.g. format)
+            
+        Yields:
+            Dict: Message resources in the order of message_ids
+            
+        Raises:
+            Exception: Any error raised while fetching, re-raised in the caller
+        """
+        fetched = queue.Queue(maxsize=self.PREFETCH_BATCHES)
+        stop = threading.Event()
+        
+        def _put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    fetched.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        def _produce():
+            try:
+                for batch in self._iter_message_batches(message_ids, stop, **get_kwargs):
+                    if not _put(batch):
+                        return
+            except Exception as e:
+                _put(e)
+                return
+            _put(None)
+        
+        producer = threading.Thread(target=_produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = fetched.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield from item
+        finally:
+            stop.set()
+            producer.join()
+
+    def _is_retryable(self, error: HttpError) -> bool:
+        """
+        Tells rate-limit and transient server errors apart from permanent ones.
+        
+        Gmail reports some rate limits as 403, which is otherwise used for
+        permanent errors such as missing permissions, so a 403 is only
+        retryable when its error reason says so.
+        
+        Args:
+            error: Error returned for a messages.get request
+            
+        Returns:
+            bool: True if the request should be retried
+        """
+        status = error.resp.status
+        if status in self.RETRY_STATUSES:
+            return True
+        if status != 403:
+            return False
+        try:
+            errors = json.loads(error.content)['error']['errors']
+            return any(item.get('reason') in self.RATE_LIMIT_REASONS for item in errors)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+
+    def _retry_messages(self, message_ids: List[str], stop: Optional[threading.Event] = None,
+                        **get_kwargs) -> Dict[str, Dict]:
+        """
+        Re-fetches messages individually, backing off between attempts.
+        
+        Args:
+            message_ids: IDs of the messages whose batch fetch failed
+            stop: Event that cuts the back-off short and ends retrying once set
+            **get_kwargs: Query parameters for messages.get (e.g. format)
+            
+        Returns:
+            Dict[str, Dict]: Message resources keyed by message ID; messages
+            still failing after FETCH_RETRIES attempts are left out
+        """
+        if stop is None:
+            stop = threading.Event()
+        results = {}
+        delay = self.RETRY_DELAY
+        for _ in range(self.FETCH_RETRIES):
+            logger.warning(f"Retrying {len(message_ids)} message(s) in {delay:g}s")
+            if stop.wait(delay):
+                break
+            results.update(self._get_messages_concurrently(message_ids, stop, **get_kwargs))
+            message_ids = [message_id for message_id in message_ids if message_id not in results]
+            if not message_ids:
+                break
+            delay *= 2
+        else:
+            logger.error(f"Giving up on {len(message_ids)} message(s) after {self.FETCH_RETRIES} attempts")
+        return results
+
+    def _get_messages_concurrently(self, message_ids: List[str], stop: Optional[threading.Event] = None,
+                                   **get_kwargs) -> Dict[str, Dict]:
+        """
+        Fetches message resources with up to FALLBACK_WORKERS requests in flight.
+        
+        The googleapiclient transport is not thread-safe, so the requests go
+        through a google-auth AuthorizedSession (a pooled requests.Session)
+        against the same REST endpoint. Without stored credentials the
+        messages are fetched sequentially through the service instead.
+        
+        Args:
+            message_ids: IDs of the messages to fetch
+            stop: Event that ends the sequential fetch before the next request once set
+            **get_kwargs: Query parameters for messages.get (e.g. format)
+            
+        Returns:
+            Dict[str, Dict]: Message resources keyed by message ID
+        """
+        results = {}
+        
+        if self._creds is None:
+            for message_id in message_ids:
+                if stop is not None and stop.is_set():
+                    break
+                try:
+                    results[message_id] = self.service.users().messages().get(
+                        userId='me', id=message_id, **get_kwargs).execute()
+                except HttpError as e:
+                    logger.error(f"Error fetching message {message_id}: {e}")
+            return results
+        
+        session = AuthorizedSession(self._creds)
+        
+        def _fetch(message_id: str) -> Dict:
+            response = session.get(
+                f'{self.GMAIL_API_URL}/messages/{message_id}', params=get_kwargs)
+            response.raise_for_status()
+            return response.json()
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.FALLBACK_WORKERS) as pool:
+                futures = {pool.submit(_fetch, message_id): message_id
+                           for message_id in message_ids}
+                for future in as_completed(futures):
+                    message_id = futures[future]
+                    try:
+                        results[message_id] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error fetching message {message_id}: {e}")
+        finally:
+            session.close()
+        
+        return results
+
+    def _get_headers(self, payload) -> Dict[str, str]:
+        """Extract headers from message payload, keyed by lower-cased name."""
+        return {header['name'].lower(): header['value'] for header in payload['headers']}
+
     def _get_body_text(self, payload) -> str:
         """Extract text body from message payload."""
         if payload.get('body', {}).get('data'):
@@ -474,20 +909,29 @@ class GmailHandler:
         
         return ''
 
-    def _get_body_html(self, payload) -> Optional[str]:
-        """Extract HTML body from message payload."""
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/html':
-                    return self._decode_body(part['body'].get('data', ''))
-        return None
+    def _get_bodies(self, payload) -> Tuple[str, Optional[str]]:
+        """Extract text and HTML bodies from message payload in one pass over its parts."""
+        body_text = None
+        body_html = None
+        
+        if payload.get('body', {}).get('data'):
+            body_text = self._decode_body(payload['body']['data'])
+        
+        for part in payload.get('parts', ()):
+            if part['mimeType'] == 'text/plain' and body_text is None:
+                body_text = self._decode_body(part['body'].get('data', ''))
+            elif part['mimeType'] == 'text/html' and body_html is None:
+                body_html = self._decode_body(part['body'].get('data', ''))
+            if body_text is not None and body_html is not None:
+                break
+        
+        return body_text or '', body_html
 
     def _decode_body(self, data: str) -> str:
         """Decode base64 body content."""
-        import base64
         if not data:
             return ''
-        return base64.urlsafe_b64decode(data).decode('utf-8')
+        return urlsafe_b64decode(data).decode('utf-8')
 
     def star_email(self, message_id: str) -> bool:
         """
@@ -589,6 +1033,7 @@ class GmailHandler:
             
             # Update the bot indicators with loaded weights
             self.bot_indicators.update(weights_data['weights'])
+            self._refresh_bot_indicators()
             
             logger.info(f"Successfully loaded bot detection weights from {file_path}")
             logger.info(f"Last updated: {weights_data['metadata']['last_updated']}")
@@ -630,227 +1075,39 @@ class GmailHandler:
             logger.info(f"Analyzing {len(messages)} historical emails...")
             
             # Initialize counters for pattern analysis
-            pattern_counts = {
-                'headers': {},
-                'keywords': {},
-                'patterns': {},
-                'sender_patterns': {},
-                'subject_patterns': {},
-                'time_patterns': {},
-                'length_patterns': {},
-                'link_patterns': {},
-                'domain_patterns': {},
-                'content_patterns': {},
-                'reply_patterns': {},
-                'attachment_patterns': {},
-                'spacing_patterns': {},
-                'signature_patterns': {}
-            }
+            categories = (
+                'headers', 'keywords', 'patterns', 'sender_patterns',
+                'subject_patterns', 'time_patterns', 'length_patterns',
+                'link_patterns', 'domain_patterns', 'content_patterns',
+                'reply_patterns', 'attachment_patterns', 'spacing_patterns',
+                'signature_patterns'
+            )
+            pattern_counts = {category: Counter() for category in categories}
             
             # Analyze each message
-            for message in messages:
-                msg = self.service.users().messages().get(
-                    userId='me', id=message['id'], format='full').execute()
-                
-                # Extract headers
-                headers = {}
-                for header in msg['payload']['headers']:
-                    headers[header['name'].lower()] = header['value']
-                
-                # Extract body
-                body_text = self._get_body_text(msg['payload'])
-                
-                # Extract sender domain
-                sender = headers.get('from', '')
-                if '@' in sender:
-                    domain = sender.split('@')[1].lower()
-                    pattern_counts['domain_patterns'][domain] = pattern_counts['domain_patterns'].get(domain, 0) + 1
-                
-                # Analyze sender patterns
-                sender_name = sender.split('<')[0].strip()
-                if sender_name:
-                    pattern_counts['sender_patterns'][sender_name] = pattern_counts['sender_patterns'].get(sender_name, 0) + 1
-                
-                # Analyze subject patterns
-                subject = headers.get('subject', '')
-                if subject:
-                    # Look for common subject patterns
-                    if 're:' in subject.lower():
-                        pattern_counts['subject_patterns']['re:'] = pattern_counts['subject_patterns'].get('re:', 0) + 1
-                    if 'fw:' in subject.lower():
-                        pattern_counts['subject_patterns']['fw:'] = pattern_counts['subject_patterns'].get('fw:', 0) + 1
-                    # Look for marketing patterns
-                    if any(word in subject.lower() for word in ['sale', 'offer', 'discount', 'limited time']):
-                        pattern_counts['subject_patterns']['marketing'] = pattern_counts['subject_patterns'].get('marketing', 0) + 1
-                
-                # Analyze time patterns
-                date = datetime.fromtimestamp(int(msg['internalDate'])/1000)
-                hour = date.hour
-                pattern_counts['time_patterns'][hour] = pattern_counts['time_patterns'].get(hour, 0) + 1
-                
-                # Analyze length patterns
-                body_length = len(body_text)
-                length_category = 'short' if body_length < 100 else 'medium' if body_length < 500 else 'long'
-                pattern_counts['length_patterns'][length_category] = pattern_counts['length_patterns'].get(length_category, 0) + 1
-                
-                # Analyze content patterns
-                # Check for common bot-generated content patterns
-                if 'unsubscribe' in body_text.lower():
-                    pattern_counts['content_patterns']['unsubscribe'] = pattern_counts['content_patterns'].get('unsubscribe', 0) + 1
-                if 'click here' in body_text.lower():
-                    pattern_counts['content_patterns']['click_here'] = pattern_counts['content_patterns'].get('click_here', 0) + 1
-                if 'view in browser' in body_text.lower():
-                    pattern_counts['content_patterns']['view_in_browser'] = pattern_counts['content_patterns'].get('view_in_browser', 0) + 1
-                
-                # Analyze reply patterns
-                if '>' in body_text:  # Common reply indicator
-                    pattern_counts['reply_patterns']['quoted'] = pattern_counts['reply_patterns'].get('quoted', 0) + 1
-                if 'On ' in body_text and 'wrote:' in body_text:  # Common email client reply format
-                    pattern_counts['reply_patterns']['email_client'] = pattern_counts['reply_patterns'].get('email_client', 0) + 1
-                
-                # Analyze attachment patterns
-                if 'parts' in msg['payload']:
-                    for part in msg['payload']['parts']:
-                        if 'filename' in part:
-                            pattern_counts['attachment_patterns']['has_attachment'] = pattern_counts['attachment_patterns'].get('has_attachment', 0) + 1
-                            break
-                
-                # Analyze spacing patterns
-                lines = body_text.split('\n')
-                avg_line_length = sum(len(line) for line in lines) / len(lines) if lines else 0
-                spacing_category = 'dense' if avg_line_length > 80 else 'normal' if avg_line_length > 40 else 'sparse'
-                pattern_counts['spacing_patterns'][spacing_category] = pattern_counts['spacing_patterns'].get(spacing_category, 0) + 1
-                
-                # Analyze signature patterns
-                if '--' in body_text or 'Best regards' in body_text or 'Thanks' in body_text:
-                    pattern_counts['signature_patterns']['has_signature'] = pattern_counts['signature_patterns'].get('has_signature', 0) + 1
-                
-                # Count header patterns
-                for header in headers:
-                    pattern_counts['headers'][header] = pattern_counts['headers'].get(header, 0) + 1
-                
-                # Count keyword patterns
-                for keyword in self.bot_indicators['keywords']:
-                    if keyword in body_text.lower():
-                        pattern_counts['keywords'][keyword] = pattern_counts['keywords'].get(keyword, 0) + 1
-                
-                # Count regex patterns
-                for pattern in self.bot_indicators['patterns']:
-                    if re.search(pattern, body_text):
-                        pattern_counts['patterns'][pattern] = pattern_counts['patterns'].get(pattern, 0) + 1
-                
-                # Analyze link patterns
-                links = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', body_text)
-                link_count = len(links)
-                link_category = 'none' if link_count == 0 else 'few' if link_count < 3 else 'many'
-                pattern_counts['link_patterns'][link_category] = pattern_counts['link_patterns'].get(link_category, 0) + 1
-            
-            # Calculate new weights based on frequency
-            total_messages = len(messages)
-            new_weights = {
-                'headers': {},
-                'keywords': {},
-                'patterns': {},
-                'sender_patterns': {},
-                'subject_patterns': {},
-                'time_patterns': {},
-                'length_patterns': {},
-                'link_patterns': {},
-                'domain_patterns': {},
-                'content_patterns': {},
-                'reply_patterns': {},
-                'attachment_patterns': {},
-                'spacing_patterns': {},
-                'signature_patterns': {}
-            }
-            
-            # Calculate header weights
-            for header, count in pattern_counts['headers'].items():
-                frequency = count / total_messages
-                # Higher frequency = higher weight for bot detection
-                new_weights['headers'][header] = min(1.0, frequency * 2)
-            
-            # Calculate keyword weights
-            for keyword, count in pattern_counts['keywords'].items():
-                frequency = count / total_messages
-                new_weights['keywords'][keyword] = min(1.0, frequency * 2)
-            
-            # Calculate pattern weights
-            for pattern, count in pattern_counts['patterns'].items():
-                frequency = count / total_messages
-                new_weights['patterns'][pattern] = min(1.0, frequency * 2)
-            
-            # Calculate sender pattern weights
-            for sender, count in pattern_counts['sender_patterns'].items():
-                frequency = count / total_messages
-                # Very frequent senders might be bots
-                new_weights['sender_patterns'][sender] = min(1.0, frequency * 3)
-            
-            # Calculate subject pattern weights
-            for pattern, count in pattern_counts['subject_patterns'].items():
-                frequency = count / total_messages
-                new_weights['subject_patterns'][pattern] = min(1.0, frequency * 2)
-            
-            # Calculate time pattern weights
-            for hour, count in pattern_counts['time_patterns'].items():
-                frequency = count / total_messages
-                # Emails at unusual hours might be automated
-                if hour < 6 or hour > 22:  # Late night/early morning
-                    new_weights['time_patterns'][hour] = min(1.0, frequency * 2)
-            
-            # Calculate length pattern weights
-            for length, count in pattern_counts['length_patterns'].items():
-                frequency = count / total_messages
-                # Very short or very long emails might be automated
-                if length in ['short', 'long']:
-                    new_weights['length_patterns'][length] = min(1.0, frequency * 1.5)
-            
-            # Calculate link pattern weights
-            for pattern, count in pattern_counts['link_patterns'].items():
-                frequency = count / total_messages
-                # Emails with many links might be marketing
-                if pattern == 'many':
-                    new_weights['link_patterns'][pattern] = min(1.0, frequency * 2)
-            
-            # Calculate domain pattern weights
-            for domain, count in pattern_counts['domain_patterns'].items():
-                frequency = count / total_messages
-                # Frequent domains might be automated
-                new_weights['domain_patterns'][domain] = min(1.0, frequency * 2)
-            
-            # Calculate content pattern weights
-            for pattern, count in pattern_counts['content_patterns'].items():
-                frequency = count / total_messages
-                # Marketing content patterns are strong indicators
-                new_weights['content_patterns'][pattern] = min(1.0, frequency * 2.5)
-            
-            # Calculate reply pattern weights
-            for pattern, count in pattern_counts['reply_patterns'].items():
-                frequency = count / total_messages
-                # Reply patterns indicate human interaction
-                new_weights['reply_patterns'][pattern] = min(1.0, frequency * 0.5)  # Lower weight as it indicates human
-            
-            # Calculate attachment pattern weights
-            for pattern, count in pattern_counts['attachment_patterns'].items():
-                frequency = count / total_messages
-                # Attachments are more common in human emails
-                new_weights['attachment_patterns'][pattern] = min(1.0, frequency * 0.3)  # Lower weight as it indicates human
-            
-            # Calculate spacing pattern weights
-            for pattern, count in pattern_counts['spacing_patterns'].items():
-                frequency = count / total_messages
-                # Dense spacing might indicate automated content
-                if pattern == 'dense':
-                    new_weights['spacing_patterns'][pattern] = min(1.0, frequency * 1.5)
-            
-            # Calculate signature pattern weights
-            for pattern, count in pattern_counts['signature_patterns'].items():
-                frequency = count / total_messages
-                # Signatures indicate human emails
-                new_weights['signature_patterns'][pattern] = min(1.0, frequency * 0.4)  # Lower weight as it indicates human
+            total_messages = 0
+            for msg in self._prefetch_messages([m['id'] for m in messages],
+                                               format='full', fields=self.ANALYZE_FIELDS):
+                self._classify_message(msg, pattern_counts)
+                total_messages += 1
+            
+            # Calculate new weights based on frequency, over the messages
+            # actually fetched rather than the ones listed
+            if total_messages == 0:
+                # Nothing to learn from; keep the current weights rather than clearing them
+                logger.info("No historical emails to analyze. Bot detection weights unchanged.")
+                return {}
+            new_weights = {category: {} for category in categories}
+            
+            for category, factor, keep in self.WEIGHT_FACTORS:
+                counts = pattern_counts[category]
+                if keep is not None:
+                    counts = {key: count for key, count in counts.items() if keep(key)}
+                new_weights[category] = self._frequency_weights(counts, total_messages, factor)
             
             # Update the bot indicators with new weights
             self.bot_indicators.update(new_weights)
+            self._refresh_bot_indicators()
             
             # After updating weights, save them
             self.save_learned_weights(self.weights_path)
@@ -860,4 +1117,131 @@ class GmailHandler:
             
         except Exception as e:
             logger.error(f"Error analyzing historical emails: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+    @staticmethod
+    def _frequency_weights(counts: Dict, total: int, factor: float) -> Dict:
+        """
+        Maps each counted key to min(1.0, count / total * factor).
+        
+        The division is folded into one scale factor per category, so each
+        key costs a multiply rather than a divide and a multiply.
+        
+        Args:
+            counts: Occurrence count per key
+            total: Number of messages the counts were taken over
+            factor: Multiplier applied to the frequency
+            
+        Returns:
+            Dict: Weight per key
+        """
+        if not counts:
+            return {}
+        
+        scale = factor / total
+        # Counts at or above this saturate at 1.0; a comparison is cheaper than min()
+        saturated = total / factor
+        return {key: 1.0 if count >= saturated else count * scale
+                for key, count in counts.items()}
+
+    def _classify_message(self, msg: Dict, pattern_counts: Dict[str, Counter]) -> None:
+        """
+        Counts the bot-detection patterns found in one message.
+        
+        Args:
+            msg: Full Gmail message resource
+            pattern_counts: Per-category counters to update in place
+        """
+        # Extract headers
+        headers = self._get_headers(msg['payload'])
+        
+        # Extract body
+        body_text = self._get_body_text(msg['payload'])
+        body_lower = body_text.lower()
+        
+        # Extract sender domain
+        sender = headers.get('from', '')
+        if '@' in sender:
+            domain = sender.split('@')[1].lower()
+            pattern_counts['domain_patterns'][domain] += 1
+        
+        # Analyze sender patterns
+        sender_name = sender.split('<')[0].strip()
+        if sender_name:
+            pattern_counts['sender_patterns'][sender_name] += 1
+        
+        # Analyze subject patterns
+        subject = headers.get('subject', '')
+        if subject:
+            subject_lower = subject.lower()
+            # Look for common subject patterns
+            if 're:' in subject_lower:
+                pattern_counts['subject_patterns']['re:'] += 1
+            if 'fw:' in subject_lower:
+                pattern_counts['subject_patterns']['fw:'] += 1
+            # Look for marketing patterns
+            if any(word in subject_lower for word in self.MARKETING_SUBJECT_WORDS):
+                pattern_counts['subject_patterns']['marketing'] += 1
+        
+        # Analyze time patterns
+        date = datetime.fromtimestamp(int(msg['internalDate'])/1000)
+        hour = date.hour
+        pattern_counts['time_patterns'][hour] += 1
+        
+        # Analyze length patterns
+        body_length = len(body_text)
+        length_category = 'short' if body_length < 100 else 'medium' if body_length < 500 else 'long'
+        pattern_counts['length_patterns'][length_category] += 1
+        
+        # Analyze content patterns
+        # Check for common bot-generated content patterns
+        if 'unsubscribe' in body_lower:
+            pattern_counts['content_patterns']['unsubscribe'] += 1
+        if 'click here' in body_lower:
+            pattern_counts['content_patterns']['click_here'] += 1
+        if 'view in browser' in body_lower:
+            pattern_counts['content_patterns']['view_in_browser'] += 1
+        
+        # Analyze reply patterns
+        if '>' in body_text:  # Common reply indicator
+            pattern_counts['reply_patterns']['quoted'] += 1
+        if 'On ' in body_text and 'wrote:' in body_text:  # Common email client reply format
+            pattern_counts['reply_patterns']['email_client'] += 1
+        
+        # Analyze attachment patterns
+        if 'parts' in msg['payload']:
+            for part in msg['payload']['parts']:
+                if 'filename' in part:
+                    pattern_counts['attachment_patterns']['has_attachment'] += 1
+                    break
+        
+        # Analyze spacing patterns
+        # Same as averaging len() over body_text.split('\n'), without the split
+        newlines = body_text.count('\n')
+        avg_line_length = (len(body_text) - newlines) / (newlines + 1)
+        spacing_category = 'dense' if avg_line_length > 80 else 'normal' if avg_line_length > 40 else 'sparse'
+        pattern_counts['spacing_patterns'][spacing_category] += 1
+        
+        # Analyze signature patterns
+        if '--' in body_text or 'Best regards' in body_text or 'Thanks' in body_text:
+            pattern_counts['signature_patterns']['has_signature'] += 1
+        
+        # Count header patterns
+        pattern_counts['headers'].update(headers.keys())
+        
+        # Count keyword patterns
+        pattern_counts['keywords'].update(
+            keyword for keyword in self.bot_indicators['keywords']
+            if keyword in body_lower
+        )
+        
+        # Count regex patterns
+        for regex, _ in self._compiled_patterns:
+            if regex.search(body_text):
+                pattern = regex.pattern
+                pattern_counts['patterns'][pattern] += 1
+        
+        # Analyze link patterns; three links already means 'many', so stop there
+        link_count = sum(1 for _ in islice(self.URL_PATTERN.finditer(body_text), 3))
+        link_category = 'none' if link_count == 0 else 'few' if link_count < 3 else 'many'
+        pattern_counts['link_patterns'][link_category] += 1
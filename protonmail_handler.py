@@ -6,7 +6,8 @@ This module provides functionality to interact with ProtonMail accounts.
 import logging
 import re
 from typing import Dict, List, Optional, Tuple
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
 import json
 import os
 from protonmail import ProtonMailAPI  # This would need to be implemented
@@ -61,9 +62,18 @@ class ProtonMailHandler:
             'spacing_patterns': {},
             'signature_patterns': {}
         }
+        self._compiled_patterns = []
         
-        # Try to load saved weights
-        self.load_learned_weights(weights_path)
+        # Try to load saved weights; loading compiles the patterns itself
+        if not self.load_learned_weights(weights_path):
+            self._refresh_bot_indicators()
+    
+    def _refresh_bot_indicators(self) -> None:
+        """Rebuilds state derived from bot_indicators; call whenever the weights change."""
+        self._compiled_patterns = [
+            (re.compile(pattern), weight)
+            for pattern, weight in self.bot_indicators['patterns']
+        ]
     
     def authenticate(self) -> bool:
         """
@@ -160,8 +170,8 @@ class ProtonMailHandler:
                     indicators_checked += 1
             
             # Check patterns
-            for pattern, weight in self.bot_indicators['patterns']:
-                if re.search(pattern, body_text):
+            for pattern, weight in self._compiled_patterns:
+                if pattern.search(body_text):
                     total_score += weight
                     indicators_checked += 1
             
@@ -354,22 +364,14 @@ class ProtonMailHandler:
             logger.info(f"Analyzing {len(messages)} historical emails...")
             
             # Initialize pattern counters
-            pattern_counts = {
-                'headers': {},
-                'keywords': {},
-                'patterns': {},
-                'sender_patterns': {},
-                'subject_patterns': {},
-                'time_patterns': {},
-                'length_patterns': {},
-                'link_patterns': {},
-                'domain_patterns': {},
-                'content_patterns': {},
-                'reply_patterns': {},
-                'attachment_patterns': {},
-                'spacing_patterns': {},
-                'signature_patterns': {}
-            }
+            categories = [
+                'headers', 'keywords', 'patterns', 'sender_patterns',
+                'subject_patterns', 'time_patterns', 'length_patterns',
+                'link_patterns', 'domain_patterns', 'content_patterns',
+                'reply_patterns', 'attachment_patterns', 'spacing_patterns',
+                'signature_patterns'
+            ]
+            pattern_counts = {category: Counter() for category in categories}
             
             # Analyze each message
             for msg in messages:
@@ -377,15 +379,14 @@ class ProtonMailHandler:
                 sender = msg['from']
                 if '@' in sender:
                     domain = sender.split('@')[1].lower()
-                    pattern_counts['domain_patterns'][domain] = pattern_counts['domain_patterns'].get(domain, 0) + 1
+                    pattern_counts['domain_patterns'][domain] += 1
                 
                 # Analyze content patterns
-                body_text = msg['body']
-                if 'unsubscribe' in body_text.lower():
-                    pattern_counts['content_patterns']['unsubscribe'] = pattern_counts['content_patterns'].get('unsubscribe', 0) + 1
+                if 'unsubscribe' in msg['body'].lower():
+                    pattern_counts['content_patterns']['unsubscribe'] += 1
                 
                 # Add more pattern analysis here...
-                
+            
             # Calculate new weights based on frequency
             total_messages = len(messages)
             new_weights = {}
@@ -399,6 +400,7 @@ class ProtonMailHandler:
             
             # Update the bot indicators
             self.bot_indicators.update(new_weights)
+            self._refresh_bot_indicators()
             
             # Save the learned weights
             self.save_learned_weights(self.weights_path)
@@ -456,6 +458,7 @@ class ProtonMailHandler:
             
             if 'weights' in weights_data:
                 self.bot_indicators.update(weights_data['weights'])
+                self._refresh_bot_indicators()
                 return True
             
             return False
@@ -70,6 +70,17 @@ def test_validation():
         except ValueError:
             print("  ✓ SQL injection attempt blocked")
 
+        # Test bulk message ID validation
+        mixed_ids = [valid_id, " 18a1b2c3d4e5f6a8 ", "../../etc/passwd", None]
+        assert validator.validate_message_ids_bulk(mixed_ids, strict=False) == [
+            valid_id, "18a1b2c3d4e5f6a8"
+        ]
+        try:
+            validator.validate_message_ids_bulk(mixed_ids)
+            return False
+        except ValueError:
+            print("  ✓ Bulk message ID validation working")
+
         # Test email validation
         email = "user@example.com"
         assert validator.validate_email_address(email) == email.lower()
@@ -14,6 +14,7 @@ import os
 import sys
 import tempfile
 import json
+import logging
 from pathlib import Path
 from datetime import datetime, timedelta
 
@@ -27,7 +28,7 @@ try:
     from config.settings import Settings, get_settings
     from core.security.credentials import CredentialManager
     from core.security.validation import SecurityValidator
-    from core.security.logging_config import setup_logging, get_logger
+    from core.security.logging_config import setup_logging, get_logger, flush_logging, EmailBodyFilter
     print("✅ Core imports successful")
 
     # Try to import SQLCipher-dependent modules
@@ -447,7 +448,15 @@ LOG_LEVEL=DEBUG
         logger.info("Password: supersecret123")
         print("  ✓ Sensitive data logged (should be filtered)")
 
+        # Body redaction starts at the earliest indicator in the message
+        record = logging.LogRecord('test', logging.INFO, __file__, 0,
+                                   "message: x body: y", None, None)
+        EmailBodyFilter().filter(record)
+        assert record.msg == "message: [REDACTED]", record.msg
+        print("  ✓ Email body redacted from the first indicator")
+
         # Read log file to verify filtering
+        flush_logging()
         log_file = Path(self.temp_dir) / 'test.log'
         if log_file.exists():
             log_content = log_file.read_text()
@@ -0,0 +1,269 @@
+"""
+Unit tests for GmailHandler's message parsing and bot-detection helpers.
+
+These run without network access; message resources are built in memory.
+"""
+
+import base64
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from email_handler import GmailHandler, HttpError
+
+
+def _encode(text):
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def _full_message():
+    """A messages.get(format='full') resource with text, HTML and attachment parts."""
+    return {
+        'id': '18a1b2c3d4e5f6a7',
+        'threadId': '18a1b2c3d4e5f6a7',
+        'internalDate': '1700000000000',
+        'labelIds': ['INBOX', 'UNREAD'],
+        'snippet': 'Our spring sale',
+        'sizeEstimate': 4096,
+        'payload': {
+            'partId': '',
+            'mimeType': 'multipart/mixed',
+            'filename': '',
+            'headers': [
+                {'name': 'From', 'value': 'Shop News <news@shop.example.com>'},
+                {'name': 'To', 'value': 'user@example.com'},
+                {'name': 'Subject', 'value': 'Spring sale: 20% off'},
+                {'name': 'List-Unsubscribe', 'value': '<mailto:unsub@shop.example.com>'},
+            ],
+            'body': {'size': 0},
+            'parts': [
+                {
+                    'partId': '0',
+                    'mimeType': 'text/plain',
+                    'filename': '',
+                    'headers': [{'name': 'Content-Type', 'value': 'text/plain'}],
+                    'body': {'size': 80, 'data': _encode(
+                        'Hello,\nClick here for $20 off: https://shop.example.com/sale\n'
+                        'Unsubscribe any time.\n--\nShop News')},
+                },
+                {
+                    'partId': '1',
+                    'mimeType': 'text/html',
+                    'filename': '',
+                    'headers': [{'name': 'Content-Type', 'value': 'text/html'}],
+                    'body': {'size': 40, 'data': _encode('<p>Click here</p>')},
+                },
+                {
+                    'partId': '2',
+                    'mimeType': 'application/pdf',
+                    'filename': 'coupon.pdf',
+                    'headers': [{'name': 'Content-Type', 'value': 'application/pdf'}],
+                    'body': {'size': 2048, 'attachmentId': 'ANGjdJ8'},
+                },
+            ],
+        },
+    }
+
+
+def _parse_fields(mask, pos=0):
+    """Parses a partial-response fields mask into nested dicts; returns (tree, end)."""
+    tree = {}
+    while pos < len(mask):
+        match = re.compile(r'[\w/]+').match(mask, pos)
+        path = match.group().split('/')
+        pos = match.end()
+        node = tree
+        for name in path[:-1]:
+            node = node.setdefault(name, {})
+        if pos < len(mask) and mask[pos] == '(':
+            node[path[-1]], pos = _parse_fields(mask, pos + 1)
+        else:
+            node[path[-1]] = None
+        if pos < len(mask) and mask[pos] == ')':
+            return tree, pos + 1
+        pos += 1  # skip ','
+    return tree, pos
+
+
+def _apply_fields(resource, tree):
+    """Keeps only the fields in tree, as the API does for a fields mask."""
+    if isinstance(resource, list):
+        return [_apply_fields(item, tree) for item in resource]
+    if tree is None:
+        return resource
+    return {key: _apply_fields(resource[key], subtree)
+            for key, subtree in tree.items() if key in resource}
+
+
+def _shape(resource, mask):
+    return _apply_fields(resource, _parse_fields(mask)[0])
+
+
+def _handler(tmp_path):
+    return GmailHandler(weights_path=str(tmp_path / 'bot_weights.json'))
+
+
+def _classify(handler, msg):
+    pattern_counts = {category: Counter() for category, _, _ in GmailHandler.WEIGHT_FACTORS}
+    handler._classify_message(msg, pattern_counts)
+    return pattern_counts
+
+
+def test_analyze_fields_cover_classify_message(tmp_path):
+    handler = _handler(tmp_path)
+    full = _full_message()
+    shaped = _shape(full, GmailHandler.ANALYZE_FIELDS)
+
+    assert _classify(handler, shaped) == _classify(handler, full)
+    assert _classify(handler, shaped)['attachment_patterns']['has_attachment'] == 1
+
+
+def test_fetch_fields_cover_fetch_recent_emails(tmp_path):
+    handler = _handler(tmp_path)
+    full = _full_message()
+    shaped = _shape(full, GmailHandler.FETCH_FIELDS)
+
+    for key in ('id', 'threadId', 'internalDate', 'labelIds'):
+        assert shaped[key] == full[key]
+    assert handler._get_headers(shaped['payload']) == handler._get_headers(full['payload'])
+    assert handler._get_bodies(shaped['payload']) == handler._get_bodies(full['payload'])
+
+
+def test_non_ascii_keywords_match_only_themselves(tmp_path):
+    handler = _handler(tmp_path)
+    handler.bot_indicators['keywords'] = {'пример': 0.9, 'café': 0.8}
+    handler._refresh_bot_indicators()
+
+    assert handler.is_bot_generated({}, "Привет мир ?????? hello") == (False, 0.0)
+    assert handler.is_bot_generated({}, "Visit our CAFÉ today") == (True, 1.0)
+
+
+class _FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.request_ids = []
+
+    def add(self, request, request_id=None):
+        self.request_ids.append(request_id)
+
+    def execute(self):
+        for message_id in self.request_ids:
+            if message_id in self.service.rate_limited:
+                self.callback(message_id, None, self.service.error())
+            else:
+                self.callback(message_id, {'id': message_id}, None)
+
+
+class _FakeService:
+    """
+    Serves messages.get through batches. IDs in rate_limited fail in a batch;
+    with persistent=True their individual retries fail as well.
+    """
+
+    def __init__(self, rate_limited=(), persistent=False, status=429, reason='rateLimitExceeded'):
+        self.rate_limited = set(rate_limited)
+        self.persistent = persistent
+        self.status = status
+        self.reason = reason
+        self.calls = 0
+
+    def error(self):
+        content = json.dumps({'error': {'code': self.status, 'errors': [{'reason': self.reason}]}})
+        return HttpError(mock.Mock(status=self.status), content.encode('utf-8'))
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def new_batch_http_request(self, callback):
+        self.calls += 1
+        return _FakeBatch(self, callback)
+
+    def get(self, userId, id, **kwargs):
+        self.calls += 1
+        request = mock.Mock()
+        if self.persistent and id in self.rate_limited:
+            request.execute.side_effect = self.error()
+        else:
+            request.execute.return_value = {'id': id}
+        return request
+
+
+def test_rate_limited_sub_requests_are_retried(tmp_path):
+    handler = _handler(tmp_path)
+    handler.service = _FakeService(rate_limited={'b', 'd'})
+    ids = ['a', 'b', 'c', 'd']
+
+    with mock.patch.object(GmailHandler, 'RETRY_DELAY', 0.01):
+        messages = handler._get_messages(ids, format='full')
+
+    assert [msg['id'] for msg in messages] == ids
+
+
+def test_403_is_retried_only_for_rate_limit_reasons(tmp_path):
+    handler = _handler(tmp_path)
+    ids = ['a', 'b']
+
+    handler.service = _FakeService(rate_limited={'b'}, status=403, reason='userRateLimitExceeded')
+    with mock.patch.object(GmailHandler, 'RETRY_DELAY', 0.01):
+        assert [msg['id'] for msg in handler._get_messages(ids)] == ids
+
+    handler.service = _FakeService(rate_limited={'b'}, status=403, reason='insufficientPermissions')
+    with mock.patch.object(handler, '_retry_messages') as retry:
+        assert [msg['id'] for msg in handler._get_messages(ids)] == ['a']
+    retry.assert_not_called()
+
+
+def test_prefetch_stops_fetching_when_closed(tmp_path):
+    handler = _handler(tmp_path)
+    handler.service = _FakeService(rate_limited={'b'}, persistent=True)
+
+    threads = set(threading.enumerate())
+
+    with mock.patch.object(GmailHandler, 'BATCH_SIZE', 1):
+        messages = handler._prefetch_messages(['a', 'b', 'c'])
+        assert next(messages)['id'] == 'a'
+        started = time.monotonic()
+        messages.close()
+
+    # The back-off is cut short and the fetching thread has finished
+    assert time.monotonic() - started < GmailHandler.RETRY_DELAY
+    assert set(threading.enumerate()) == threads
+    calls = handler.service.calls
+    time.sleep(0.2)
+    assert handler.service.calls == calls
+
+
+def test_empty_history_keeps_weights(tmp_path):
+    handler = _handler(tmp_path)
+    handler.service = mock.MagicMock()
+    handler.service.users().messages().list().execute.return_value = {}
+    before = {category: dict(weights) for category, weights in handler.bot_indicators.items()}
+
+    assert handler.analyze_historical_emails(months_back=1) == {}
+    assert handler.bot_indicators == before
+    assert not (tmp_path / 'bot_weights.json').exists()
+    assert GmailHandler._frequency_weights({}, 0, 2) == {}
+
+
+def test_history_weights_use_fetched_message_count(tmp_path):
+    handler = _handler(tmp_path)
+    handler.service = mock.MagicMock()
+    handler.service.users().messages().list().execute.return_value = {
+        'messages': [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}]}
+    fetched = [_full_message(), _full_message()]  # 'c' could not be fetched
+
+    with mock.patch.object(handler, '_prefetch_messages', return_value=iter(fetched)):
+        weights = handler.analyze_historical_emails(months_back=1)
+
+    assert weights['signature_patterns'] == {'has_signature': 0.4}